@@ -186,6 +186,16 @@ def fetch_predictive(node_id: int, short_window: int = 30, long_window: int = 12
     return r.json()
 
 
+def fetch_risk_history(node_id: int, max_points: int = 500):
+    r = requests.get(
+        f"{BACKEND_URL}/api/predictive/{node_id}/history",
+        params={"max_points": max_points},
+        timeout=4
+    )
+    r.raise_for_status()
+    return r.json()["points"]
+
+
 # ---------------- UI HELPERS ----------------
 def status_style(status: str) -> str:
     if status == "LEAK DETECTED":
@@ -314,20 +324,11 @@ def render():
 
             st.progress(min(max(risk_score, 0), 100))
 
-            # Risk history (in-memory, per session)
-            if "risk_history" not in st.session_state:
-                st.session_state.risk_history = []
-
-            st.session_state.risk_history.append({
-                "timestamp": pd.Timestamp.utcnow(),
-                "node_id": node_id,
-                "risk_score": risk_score
-            })
-            st.session_state.risk_history = st.session_state.risk_history[-200:]
-
-            rh = pd.DataFrame(st.session_state.risk_history)
-            rh = rh[rh["node_id"] == node_id]
+            # Risk history (recorded by the backend on a fixed cadence, shared by all viewers)
+            rh = pd.DataFrame(fetch_risk_history(node_id))
             if not rh.empty:
+                rh["timestamp"] = pd.to_datetime(rh["timestamp"], errors="coerce")
+                rh = rh.dropna(subset=["timestamp"]).sort_values("timestamp")
                 st.subheader("Risk Trend (History)")
                 st.line_chart(rh.set_index("timestamp")[["risk_score"]])
 
@@ -1,9 +1,36 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Optional
+import os
 import random
+import threading
+import time
 
-app = FastAPI(title="Pipeline Dummy Backend")
+from notifications import AlertDispatcher
+from retention import HistoryStore, iso_utc
+
+# Per-node history with tiered retention (raw -> 1 min -> 1 h rollups).
+# See retention.py for the retention knobs (RAW_RETENTION_SECONDS, ...).
+HISTORY = HistoryStore()
+
+# Webhook alerts on leak status changes; disabled unless ALERT_WEBHOOK_URLS is set.
+NOTIFIER = AlertDispatcher()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    HISTORY.start()
+    NOTIFIER.start()
+    yield
+    NOTIFIER.stop()
+    HISTORY.stop()
+
+
+app = FastAPI(title="Pipeline Dummy Backend", lifespan=lifespan)
 
 # Allow Streamlit (frontend) to call this backend
 app.add_middleware(
@@ -14,11 +41,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory history buffer (simple for demo)
-HISTORY = []
-MAX_POINTS = 300  # last ~300 samples
-
-
 def simulate_sensor_reading():
     """
     Generates a single reading with mild noise.
@@ -81,10 +103,32 @@ def simulate_sensor_reading():
     }
 
 
-def push_history(point):
-    HISTORY.append(point)
-    if len(HISTORY) > MAX_POINTS:
-        HISTORY.pop(0)
+def push_history(point, ts=None):
+    HISTORY.add(point["node_id"], point, ts)
+
+
+# Last status seen per node, so only transitions are notified
+LAST_STATUS_BY_NODE = {}
+STATUS_LOCK = threading.Lock()
+
+
+def notify_status_change(point):
+    node_id = point["node_id"]
+    status = point["leak_status"]
+    with STATUS_LOCK:
+        prev = LAST_STATUS_BY_NODE.get(node_id)
+        LAST_STATUS_BY_NODE[node_id] = status
+
+    # A node coming online healthy isn't worth an alert
+    if prev == status or (prev is None and status == "NORMAL"):
+        return
+    NOTIFIER.submit({
+        "node_id": node_id,
+        "previous_status": prev,
+        "status": status,
+        "timestamp": point["timestamp"],
+        "leak_score": point["leak_score"],
+    })
 
 
 @app.get("/api/health")
@@ -100,12 +144,9 @@ def root():
 @app.get("/api/latest/{node_id}")
 def latest_node(node_id: int):
     # 1. Try to find the latest real data for this node in history
-    # Filter points for this node
-    node_points = [p for p in HISTORY if p.get("node_id") == node_id]
-    
-    if node_points:
-        # Return the most recent point (last ONE added)
-        return node_points[-1]
+    latest = HISTORY.latest(node_id)
+    if latest:
+        return latest
     
     # 2. If no real data, return "Waiting" placeholder (Zeroes)
     # This prevents random confusion.
@@ -126,9 +167,30 @@ def latest_node(node_id: int):
 
 
 @app.get("/api/history/{node_id}")
-def history_node(node_id: int):
-    node_points = [p for p in HISTORY if p.get("node_id") == node_id]
-    return {"points": node_points}
+def history_node(
+    node_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    resolution: int = 0,
+):
+    # No params -> raw samples from the recent window (original behaviour).
+    # Longer ranges / coarser resolution are served from the 1 min / 1 h rollups.
+    return HISTORY.query(
+        node_id,
+        start=_epoch(start) if start else None,
+        end=_epoch(end) if end else None,
+        resolution=resolution,
+    )
+
+
+@app.get("/api/retention/stats")
+def retention_stats():
+    return {"nodes": HISTORY.stats()}
+
+
+@app.get("/api/notifications/stats")
+def notification_stats():
+    return NOTIFIER.stats()
 
 
 from pydantic import BaseModel
@@ -142,6 +204,8 @@ class SensorData(BaseModel):
 
 @app.post("/api/sensor-data")
 def receive_sensor_data(data: SensorData):
+    now = time.time()
+
     # Convert bool status to string for frontend compatibility
     status = "LEAK DETECTED" if data.is_leak else "NORMAL"
     
@@ -149,7 +213,7 @@ def receive_sensor_data(data: SensorData):
     # We fill missing fields (pressure, vibration) with defaults or dummy values
     # to prevent the frontend from crashing.
     point = {
-        "timestamp": datetime.utcnow().isoformat() + "Z",
+        "timestamp": iso_utc(now),
         "node_id": data.node_id,
         "pressure_bar": 0.0,  # Not measured by these sensors
         "flow_lpm": round(data.flow, 2),
@@ -163,7 +227,9 @@ def receive_sensor_data(data: SensorData):
         "node_spacing_m": 50,
     }
     
-    push_history(point)
+    push_history(point, now)
+    notify_status_change(point)
+    record_risk_sample(data.node_id, now)
     return {"status": "received", "data": point}
 
 # ---------------- PREDICTIVE MAINTENANCE (LEVEL 1, NO TRAINING) ----------------
@@ -346,5 +412,137 @@ def compute_predictive_risk(node_points, short_window=30, long_window=120):
 
 @app.get("/api/predictive/{node_id}")
 def predictive_node(node_id: int, short_window: int = 30, long_window: int = 120):
-    node_points = [p for p in HISTORY if p.get("node_id") == node_id]
+    node_points = HISTORY.raw_points(node_id)
     return compute_predictive_risk(node_points, short_window=short_window, long_window=long_window)
+
+
+# ---------------- RISK TIME SERIES (SERVER-SIDE, PER NODE) ----------------
+# Risk is sampled on a fixed cadence while data is ingested, so every viewer
+# sees the same complete trend and the dashboard no longer has to call
+# compute_predictive_risk just to grow its chart.
+
+RISK_SAMPLE_SECONDS = float(os.getenv("RISK_SAMPLE_SECONDS", "10"))
+RISK_MAX_POINTS = int(os.getenv("RISK_MAX_POINTS", "8640"))  # ~24h at 10s cadence
+
+# Levels / factors are stored as 1-byte codes; index 0 is the fallback.
+RISK_LEVELS = ("UNKNOWN", "LOW", "MEDIUM", "HIGH")
+DOMINANT_FACTORS = ("STABLE", "PRESSURE_DRIFT", "VIBRATION_DRIFT")
+
+
+def _code(table, value):
+    return table.index(value) if value in table else 0
+
+
+def _epoch(dt):
+    # Query params without an offset are treated as UTC, like our timestamps.
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+class RiskSeries:
+    """
+    Compact per-node risk history backed by parallel typed arrays
+    (timestamp, score, level code, factor code) instead of a list of dicts.
+    Oldest samples are dropped once max_points is exceeded.
+    """
+
+    def __init__(self, max_points=RISK_MAX_POINTS):
+        self.max_points = max_points
+        self.ts = array("d")
+        self.score = array("B")
+        self.level = array("B")
+        self.factor = array("B")
+        self.last_slot = None
+
+    def __len__(self):
+        return len(self.ts)
+
+    def append(self, ts, score, level, factor):
+        self.ts.append(ts)
+        self.score.append(max(0, min(100, int(score))))
+        self.level.append(_code(RISK_LEVELS, level))
+        self.factor.append(_code(DOMINANT_FACTORS, factor))
+
+        # Trim in chunks so we don't shift the arrays on every append
+        overflow = len(self.ts) - self.max_points
+        if overflow > max(1, self.max_points // 10):
+            for arr in (self.ts, self.score, self.level, self.factor):
+                del arr[:overflow]
+
+    def _point(self, i):
+        return {
+            "timestamp": iso_utc(self.ts[i]),
+            "risk_score": self.score[i],
+            "risk_level": RISK_LEVELS[self.level[i]],
+            "dominant_factor": DOMINANT_FACTORS[self.factor[i]],
+        }
+
+    def query(self, start_ts=None, end_ts=None, max_points=500):
+        """
+        Returns points in [start_ts, end_ts]. If there are more than max_points,
+        the range is split into max_points buckets and the peak-risk sample of
+        each bucket is kept, so short spikes survive downsampling.
+        """
+        lo = 0 if start_ts is None else bisect_left(self.ts, start_ts)
+        hi = len(self.ts) if end_ts is None else bisect_right(self.ts, end_ts)
+        n = hi - lo
+        if n <= 0:
+            return []
+        max_points = max(1, max_points)
+        if n <= max_points:
+            return [self._point(i) for i in range(lo, hi)]
+
+        out = []
+        for b in range(max_points):
+            b_lo = lo + (b * n) // max_points
+            b_hi = lo + ((b + 1) * n) // max_points
+            peak = max(range(b_lo, b_hi), key=lambda i: self.score[i])
+            out.append(self._point(peak))
+        return out
+
+
+RISK_SERIES = {}
+RISK_LOCK = threading.Lock()
+
+
+def record_risk_sample(node_id, now=None):
+    """
+    Called from the ingest path. Records at most one risk sample per node per
+    RISK_SAMPLE_SECONDS slot, so cost depends on the cadence, not on viewers.
+    """
+    now = time.time() if now is None else now
+    slot = int(now // RISK_SAMPLE_SECONDS)
+
+    with RISK_LOCK:
+        series = RISK_SERIES.setdefault(node_id, RiskSeries())
+        if series.last_slot == slot:
+            return
+        series.last_slot = slot
+
+    node_points = HISTORY.raw_points(node_id)
+    risk = compute_predictive_risk(node_points)
+
+    with RISK_LOCK:
+        series.append(now, risk["risk_score"], risk["risk_level"], risk.get("dominant_factor"))
+
+
+@app.get("/api/predictive/{node_id}/history")
+def predictive_history(
+    node_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    max_points: int = 500,
+):
+    start_ts = _epoch(start) if start else None
+    end_ts = _epoch(end) if end else None
+
+    with RISK_LOCK:
+        series = RISK_SERIES.get(node_id)
+        points = series.query(start_ts, end_ts, max_points) if series else []
+
+    return {
+        "node_id": node_id,
+        "sample_seconds": RISK_SAMPLE_SECONDS,
+        "points": points,
+    }
@@ -0,0 +1,257 @@
+"""
+Leak alert notifications over HTTP webhooks.
+
+The ingest path only calls AlertDispatcher.submit(), which never blocks:
+events go into a bounded queue and are dropped to the dead-letter log if it
+is full. A batcher thread coalesces bursts (e.g. a pipeline-wide event
+tripping many nodes) into one payload per window, and each webhook target
+has its own sender thread, bounded queue and keep-alive connection pool,
+so a slow or dead target never holds up the others.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from retention import iso_utc
+
+log = logging.getLogger(__name__)
+
+ALERT_WEBHOOK_URLS = [u.strip() for u in os.getenv("ALERT_WEBHOOK_URLS", "").split(",") if u.strip()]
+ALERT_BATCH_WINDOW_SECONDS = float(os.getenv("ALERT_BATCH_WINDOW_SECONDS", "2"))
+ALERT_MAX_BATCH = int(os.getenv("ALERT_MAX_BATCH", "100"))
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "1000"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "3"))
+ALERT_DEAD_LETTER_SIZE = int(os.getenv("ALERT_DEAD_LETTER_SIZE", "200"))
+ALERT_TIMEOUT_SECONDS = float(os.getenv("ALERT_TIMEOUT_SECONDS", "4"))
+
+# Worth retrying: throttling and server-side failures
+RETRY_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+def coalesce(events):
+    """
+    Collapses a burst into one alert per node: the status before the burst,
+    the latest status, and how many transitions happened in between.
+    """
+    by_node = {}
+    for ev in events:
+        node = by_node.get(ev["node_id"])
+        if node is None:
+            by_node[ev["node_id"]] = dict(ev, transitions=1)
+        else:
+            node.update(
+                status=ev["status"],
+                timestamp=ev["timestamp"],
+                leak_score=ev.get("leak_score"),
+                transitions=node["transitions"] + 1,
+            )
+    return list(by_node.values())
+
+
+class WebhookTarget:
+    """One webhook URL with its own bounded batch queue, sender thread and session."""
+
+    def __init__(self, url, dispatcher, queue_size, max_retries, timeout):
+        self.url = url
+        self.dispatcher = dispatcher
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.sent = 0
+        self.failed = 0
+
+        # Keep-alive pool; the session is only used by this target's thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.thread = threading.Thread(target=self._run, name=f"alert-sender:{url}", daemon=True)
+
+    def enqueue(self, payload):
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            self.failed += 1
+            self.dispatcher.dead_letter(self.url, payload, "target queue full")
+
+    def _run(self):
+        while True:
+            payload = self.queue.get()
+            if payload is None:
+                break
+            self._deliver(payload)
+        self.session.close()
+
+    def _deliver(self, payload):
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                # Exponential backoff; cut short if the dispatcher is stopping
+                if self.dispatcher.stopping.wait(min(30.0, 0.5 * 2 ** (attempt - 1))):
+                    break
+            try:
+                r = self.session.post(self.url, json=payload, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = f"{type(e).__name__}: {e}"
+                continue
+            if r.status_code < 300:
+                self.sent += 1
+                return
+            error = f"HTTP {r.status_code}"
+            if r.status_code not in RETRY_STATUS:
+                break
+
+        self.failed += 1
+        self.dispatcher.dead_letter(self.url, payload, error)
+
+
+class AlertDispatcher:
+    """
+    Batches leak status transitions and fans them out to webhook targets.
+    With no targets configured, submit() is a no-op.
+    """
+
+    def __init__(
+        self,
+        urls=None,
+        batch_window=ALERT_BATCH_WINDOW_SECONDS,
+        max_batch=ALERT_MAX_BATCH,
+        queue_size=ALERT_QUEUE_SIZE,
+        max_retries=ALERT_MAX_RETRIES,
+        dead_letter_size=ALERT_DEAD_LETTER_SIZE,
+        timeout=ALERT_TIMEOUT_SECONDS,
+    ):
+        urls = ALERT_WEBHOOK_URLS if urls is None else urls
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.events = queue.Queue(maxsize=queue_size)
+        self.dead_letters = deque(maxlen=dead_letter_size)
+        self.dead_letter_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.submitted = 0
+        self.dropped = 0
+        self.batches = 0
+        # Queued batches per target; kept small since each batch already coalesces a burst
+        target_queue = max(1, queue_size // max(1, max_batch))
+        self.targets = [WebhookTarget(u, self, target_queue, max_retries, timeout) for u in urls]
+        self._batcher = threading.Thread(target=self._run, name="alert-batcher", daemon=True)
+        self._started = False
+
+    @property
+    def enabled(self):
+        return bool(self.targets)
+
+    def submit(self, event):
+        """Queues an alert event without blocking. Returns False if it was dropped."""
+        if not self.enabled:
+            return False
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+            self.dead_letter(None, event, "event queue full")
+            return False
+        self.submitted += 1
+        return True
+
+    def dead_letter(self, url, payload, error):
+        log.warning("Alert dead-lettered (%s): %s", url or "dispatcher", error)
+        with self.dead_letter_lock:
+            self.dead_letters.append({
+                "failed_at": iso_utc(time.time()),
+                "target": url,
+                "error": error,
+                "payload": payload,
+            })
+
+    def _collect(self):
+        """
+        Blocks for the first event, then gathers the rest of the burst.
+        Returns (batch, stop) where stop means the stop marker was seen.
+        """
+        first = self.events.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                ev = self.events.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if ev is None:
+                return batch, True
+            batch.append(ev)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if not batch:
+                continue
+            alerts = coalesce(batch)
+            payload = {
+                "event": "leak_status_change",
+                "generated_at": iso_utc(time.time()),
+                "count": len(alerts),
+                "alerts": alerts,
+            }
+            self.batches += 1
+            for target in self.targets:
+                target.enqueue(payload)
+
+    def start(self):
+        if self._started or not self.enabled:
+            return
+        self._started = True
+        for target in self.targets:
+            target.thread.start()
+        self._batcher.start()
+
+    def stop(self, timeout=5.0):
+        """
+        Flushes what's queued (best effort within `timeout`) and stops the
+        threads. A stopped dispatcher can't be restarted.
+        """
+        if not self._started or self.stopping.is_set():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self.events.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._batcher.join(max(0.0, deadline - time.monotonic()))
+        for target in self.targets:
+            try:
+                target.queue.put(None, timeout=max(0.01, deadline - time.monotonic()))
+            except queue.Full:
+                pass
+        self.stopping.set()
+        for target in self.targets:
+            target.thread.join(max(0.0, deadline - time.monotonic()))
+
+    def stats(self):
+        with self.dead_letter_lock:
+            dead = list(self.dead_letters)
+        return {
+            "enabled": self.enabled,
+            "submitted": self.submitted,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "pending": self.events.qsize(),
+            "targets": [
+                {"url": t.url, "sent": t.sent, "failed": t.failed, "pending": t.queue.qsize()}
+                for t in self.targets
+            ],
+            "dead_letters": dead,
+        }
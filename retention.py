@@ -0,0 +1,296 @@
+"""
+Tiered retention for sensor history.
+
+Raw samples are kept for a short recent window. Older data survives as
+pre-aggregated rollups (count, min, max, mean, sum of squares per channel)
+at 1-minute and 1-hour resolution. A background thread compacts
+raw -> 1 min -> 1 h and expires each tier by its own retention, so memory
+stays bounded no matter how long the backend runs.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+
+log = logging.getLogger(__name__)
+
+# Numeric fields that are rolled up (must match the names the UI expects)
+CHANNELS = ("pressure_bar", "flow_lpm", "vibration", "turbidity_ntu", "tds_ppm", "leak_score")
+
+RAW_RETENTION_SECONDS = float(os.getenv("RAW_RETENTION_SECONDS", "900"))  # 15 min
+RAW_MAX_POINTS = int(os.getenv("RAW_MAX_POINTS", "5000"))  # per node, hard cap
+ROLLUP_1M_RETENTION_SECONDS = float(os.getenv("ROLLUP_1M_RETENTION_SECONDS", str(7 * 86400)))
+ROLLUP_1H_RETENTION_SECONDS = float(os.getenv("ROLLUP_1H_RETENTION_SECONDS", str(365 * 86400)))
+COMPACT_INTERVAL_SECONDS = float(os.getenv("COMPACT_INTERVAL_SECONDS", "15"))
+
+
+def iso_utc(ts):
+    return datetime.utcfromtimestamp(ts).isoformat() + "Z"
+
+
+def _sample_stats(point):
+    stats = {}
+    for ch in CHANNELS:
+        try:
+            v = float(point.get(ch) or 0.0)
+        except (TypeError, ValueError):
+            v = 0.0
+        stats[ch] = [v, v, v, v * v]
+    return stats
+
+
+def _merge(acc_count, acc_stats, count, stats):
+    """Folds (count, stats) into acc_stats in place and returns the new count."""
+    total = acc_count + count
+    for ch in CHANNELS:
+        a, b = acc_stats[ch], stats[ch]
+        a[0] = min(a[0], b[0])
+        a[1] = max(a[1], b[1])
+        a[2] = (a[2] * acc_count + b[2] * count) / total
+        a[3] += b[3]
+    return total
+
+
+def _group(summaries, resolution):
+    """
+    Merges time-ordered (start, count, stats) summaries into buckets of
+    `resolution` seconds. Returns a list of [bucket_start, count, stats].
+    """
+    out = []
+    for start, count, stats in summaries:
+        bucket = start - (start % resolution)
+        if out and out[-1][0] == bucket:
+            out[-1][1] = _merge(out[-1][1], out[-1][2], count, stats)
+        else:
+            out.append([bucket, count, {ch: list(stats[ch]) for ch in CHANNELS}])
+    return out
+
+
+def _format_bucket(start, count, stats):
+    point = {"timestamp": iso_utc(start), "count": count}
+    for ch in CHANNELS:
+        mn, mx, mean, sumsq = stats[ch]
+        var = max(0.0, sumsq / count - mean * mean)
+        point[ch] = round(mean, 3)
+        point[f"{ch}_min"] = round(mn, 3)
+        point[f"{ch}_max"] = round(mx, 3)
+        point[f"{ch}_std"] = round(var ** 0.5, 3)
+    return point
+
+
+class RollupTier:
+    """
+    Fixed-resolution rollup buckets for one node, stored as parallel typed
+    arrays ordered by bucket start. `cursor` marks the end of the data that
+    has been folded into this tier; anything later still lives in a finer tier.
+    """
+
+    def __init__(self, name, resolution, retention):
+        self.name = name
+        self.resolution = resolution
+        self.retention = retention
+        self.cursor = None
+        self.start = array("d")
+        self.count = array("L")
+        # Per channel: (min, max, mean, sum of squares)
+        self.stats = {ch: tuple(array("d") for _ in range(4)) for ch in CHANNELS}
+
+    def __len__(self):
+        return len(self.start)
+
+    def _arrays(self):
+        yield self.start
+        yield self.count
+        for arrs in self.stats.values():
+            yield from arrs
+
+    def append(self, start, count, stats):
+        self.start.append(start)
+        self.count.append(count)
+        for ch in CHANNELS:
+            for arr, v in zip(self.stats[ch], stats[ch]):
+                arr.append(v)
+
+    def drop_before(self, ts):
+        n = bisect_left(self.start, ts)
+        if n:
+            for arr in self._arrays():
+                del arr[:n]
+
+    def summaries(self, lo, hi):
+        i = bisect_left(self.start, lo - (lo % self.resolution))
+        j = bisect_left(self.start, hi)
+        for k in range(i, j):
+            stats = {ch: [arr[k] for arr in self.stats[ch]] for ch in CHANNELS}
+            yield self.start[k], self.count[k], stats
+
+
+class NodeHistory:
+    """Raw samples plus 1-minute and 1-hour rollups for a single node."""
+
+    def __init__(self):
+        self.raw = deque(maxlen=RAW_MAX_POINTS)  # (epoch_ts, point)
+        self.minute = RollupTier("1m", 60, ROLLUP_1M_RETENTION_SECONDS)
+        self.hour = RollupTier("1h", 3600, ROLLUP_1H_RETENTION_SECONDS)
+
+    def _raw_since(self, lo, hi):
+        # Newest samples are on the right; walk back only as far as needed.
+        out = []
+        for ts, point in reversed(self.raw):
+            if lo is not None and ts < lo:
+                break
+            if ts < hi:
+                out.append((ts, point))
+        out.reverse()
+        return out
+
+    def compact(self, now):
+        # raw -> 1 min (completed minutes only)
+        minute_end = now - (now % 60)
+        fresh = self._raw_since(self.minute.cursor, minute_end)
+        for bucket in _group(((ts, 1, _sample_stats(p)) for ts, p in fresh), 60):
+            self.minute.append(*bucket)
+        self.minute.cursor = minute_end
+
+        # 1 min -> 1 h (completed hours only)
+        hour_end = now - (now % 3600)
+        lo = self.hour.cursor if self.hour.cursor is not None else 0.0
+        for bucket in _group(self.minute.summaries(lo, hour_end), 3600):
+            self.hour.append(*bucket)
+        self.hour.cursor = hour_end
+
+        # Expire, never dropping data that hasn't reached the next tier yet
+        raw_cutoff = min(now - RAW_RETENTION_SECONDS, self.minute.cursor)
+        while self.raw and self.raw[0][0] < raw_cutoff:
+            self.raw.popleft()
+        self.minute.drop_before(min(now - self.minute.retention, self.hour.cursor))
+        self.hour.drop_before(now - self.hour.retention)
+
+    def summaries(self, level, lo, hi):
+        """
+        Summaries for [lo, hi) from the tier at `level` (0=raw, 1=1m, 2=1h),
+        filling the not-yet-compacted tail from the next finer tier.
+        """
+        if level == 0:
+            return [(ts, 1, _sample_stats(p)) for ts, p in self._raw_since(lo, hi)]
+        tier = self.minute if level == 1 else self.hour
+        cut = tier.cursor if tier.cursor is not None else lo
+        cut = max(lo, min(hi, cut))
+        return list(tier.summaries(lo, cut)) + self.summaries(level - 1, cut, hi)
+
+
+class HistoryStore:
+    """
+    Thread-safe per-node history with tiered retention.
+    Call start() once to run compaction in the background.
+    """
+
+    # (name, resolution_s, retention_s), finest first
+    TIERS = (
+        ("raw", 0, RAW_RETENTION_SECONDS),
+        ("1m", 60, ROLLUP_1M_RETENTION_SECONDS),
+        ("1h", 3600, ROLLUP_1H_RETENTION_SECONDS),
+    )
+
+    def __init__(self):
+        self.nodes = {}
+        self.lock = threading.RLock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def add(self, node_id, point, ts=None):
+        ts = time.time() if ts is None else ts
+        with self.lock:
+            self.nodes.setdefault(node_id, NodeHistory()).raw.append((ts, point))
+
+    def latest(self, node_id):
+        with self.lock:
+            node = self.nodes.get(node_id)
+            return node.raw[-1][1] if node and node.raw else None
+
+    def raw_points(self, node_id):
+        with self.lock:
+            node = self.nodes.get(node_id)
+            return [p for _, p in node.raw] if node else []
+
+    def route(self, start, resolution, now=None):
+        """
+        Picks the coarsest tier whose resolution fits `resolution` and whose
+        retention still covers `start`. If none fits the resolution, falls back
+        to the finest tier that covers the range (or the coarsest overall).
+        Returns the tier level index.
+        """
+        now = time.time() if now is None else now
+        covering = [i for i, (_, _, ret) in enumerate(self.TIERS) if start >= now - ret]
+        fitting = [i for i in covering if self.TIERS[i][1] <= resolution]
+        if fitting:
+            return fitting[-1]
+        if covering:
+            return covering[0]
+        return len(self.TIERS) - 1
+
+    def query(self, node_id, start=None, end=None, resolution=0, now=None):
+        """
+        History for one node between epoch seconds `start` and `end`.
+        Defaults to the raw window. With the raw tier and resolution <= 0 the
+        original sample dicts are returned; otherwise rolled-up buckets.
+        """
+        now = time.time() if now is None else now
+        start = now - RAW_RETENTION_SECONDS if start is None else start
+        end = now if end is None else end
+        level = self.route(start, resolution, now)
+        name, tier_resolution, _ = self.TIERS[level]
+
+        raw_only = level == 0 and resolution <= 0
+        res = 0 if raw_only else max(resolution, tier_resolution)
+
+        with self.lock:
+            node = self.nodes.get(node_id)
+            if node is None:
+                return {"tier": name, "resolution_s": res, "points": []}
+            if raw_only:
+                points = [p for ts, p in node.raw if start <= ts <= end]
+            else:
+                summaries = node.summaries(level, start, end)
+
+        if not raw_only:
+            points = [_format_bucket(*b) for b in _group(summaries, res)]
+
+        return {"tier": name, "resolution_s": res, "points": points}
+
+    def compact(self, now=None):
+        now = time.time() if now is None else now
+        with self.lock:
+            for node in self.nodes.values():
+                node.compact(now)
+
+    def stats(self):
+        with self.lock:
+            return {
+                node_id: {"raw": len(n.raw), "1m": len(n.minute), "1h": len(n.hour)}
+                for node_id, n in self.nodes.items()
+            }
+
+    def _run(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.compact()
+            except Exception:
+                log.exception("History compaction failed")
+
+    def start(self, interval=COMPACT_INTERVAL_SECONDS):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="history-compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None